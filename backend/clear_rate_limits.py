@@ -6,38 +6,53 @@ This is used during server startup to reset IP-based chat limits.
 
 import sqlite3
 import os
+from contextlib import closing
 from pathlib import Path
 
+from database import ShardedDatabase
+
+def get_database_paths() -> list[Path]:
+    """Get the existing database files: the base file plus any shard files."""
+
+    # Relative DATABASE_PATH values are resolved against the backend directory
+    db_path = Path(__file__).parent / os.getenv("DATABASE_PATH", "anonymous_chat.db")
+    shards = max(int(os.getenv("SQLITE_SHARDS", 1)), 1)
+
+    candidates = [db_path] + [Path(p) for p in ShardedDatabase.get_shard_paths(str(db_path), shards)]
+    return [path for path in candidates if path.exists()]
+
 def clear_rate_limits():
     """Clear all rate limit records from the database."""
 
-    # Database path
-    db_path = Path(__file__).parent / "anonymous_chat.db"
+    db_paths = get_database_paths()
 
-    if not db_path.exists():
+    if not db_paths:
         print("📝 Database doesn't exist yet, will be created on first startup")
         return
 
-    try:
-        # Connect to database
-        conn = sqlite3.connect(str(db_path))
-        cursor = conn.cursor()
-
-        # Clear rate limits table
-        cursor.execute("DELETE FROM rate_limits")
-        deleted_records = cursor.rowcount
-
-        # Commit changes
-        conn.commit()
-        conn.close()
-
-        print(f"🧹 Cleared {deleted_records} rate limit record(s)")
+    deleted_records = 0
+    failed = False
+    for db_path in db_paths:
+        try:
+            # Connect to database; closing() releases it even if the delete fails
+            with closing(sqlite3.connect(str(db_path))) as conn:
+                # Clear rate limits table
+                cursor = conn.execute("DELETE FROM rate_limits")
+                deleted_records += max(cursor.rowcount, 0)
+
+                # Commit changes
+                conn.commit()
+
+        except sqlite3.Error as e:
+            print(f"❌ Error clearing rate limits in {db_path.name}: {e}")
+            failed = True
+        except Exception as e:
+            print(f"❌ Unexpected error in {db_path.name}: {e}")
+            failed = True
+
+    print(f"🧹 Cleared {deleted_records} rate limit record(s)")
+    if not failed:
         print("✅ All IP addresses now have full quota (3 requests/hour)")
 
-    except sqlite3.Error as e:
-        print(f"❌ Error clearing rate limits: {e}")
-    except Exception as e:
-        print(f"❌ Unexpected error: {e}")
-
 if __name__ == "__main__":
     clear_rate_limits()
\ No newline at end of file
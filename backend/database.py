@@ -1,18 +1,76 @@
 import sqlite3
 import asyncio
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from contextlib import closing, contextmanager
+from collections import OrderedDict, deque
 from datetime import datetime, timedelta
 from typing import List, Dict, Any, Optional
+from concurrent.futures import ThreadPoolExecutor
 import os
 import json
 
-class Database:
+# Keep only last 20 messages (10 turns) per session
+MAX_CONVERSATION_HISTORY = 20
+
+class StorageConfigError(ValueError):
+    """Raised when the storage configuration or on-disk layout is invalid"""
+
+class StorageBackend(ABC):
+    """Storage interface for rate limits, conversation history and retention"""
+
+    @abstractmethod
+    def check_rate_limit(self, ip_address: str, limit: int = 3) -> tuple[bool, int]:
+        """
+        Check if IP has exceeded rate limit (3 requests per hour)
+        Returns (is_allowed, remaining_requests)
+        """
+
+    @abstractmethod
+    def get_rate_limit_info(self, ip_address: str) -> Dict[str, Any]:
+        """Get rate limit information for an IP"""
+
+    @abstractmethod
+    def get_conversation_history(self, ip_address: str, session_id: str) -> List[Dict[str, str]]:
+        """Get conversation history for an IP and session"""
+
+    @abstractmethod
+    def save_conversation(self, ip_address: str, session_id: str, message: str, response: str):
+        """Save a conversation turn and update session history"""
+
+    @abstractmethod
+    def cleanup_old_sessions(self, days: int = 7):
+        """Clean up sessions older than specified days"""
+
+    async def check_rate_limit_async(self, ip_address: str, limit: int = 3) -> tuple[bool, int]:
+        """Awaitable check_rate_limit; backends with writer queues override this"""
+        return self.check_rate_limit(ip_address, limit)
+
+    async def save_conversation_async(self, ip_address: str, session_id: str, message: str, response: str):
+        """Awaitable save_conversation; backends with writer queues override this"""
+        self.save_conversation(ip_address, session_id, message, response)
+
+    def close(self):
+        """Release any resources held by the backend"""
+
+class Database(StorageBackend):
+    """SQLite storage backend"""
+
     def __init__(self, db_path: str = "anonymous_chat.db"):
         self.db_path = db_path
         self.init_database()
 
+    @contextmanager
+    def _connect(self):
+        """Open a connection for a single operation, closing it afterwards"""
+        with closing(sqlite3.connect(self.db_path)) as conn:
+            with conn:
+                yield conn
+
     def init_database(self):
         """Initialize the database with required tables"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             # Rate limiting table
@@ -56,7 +114,7 @@ class Database:
         Check if IP has exceeded rate limit (3 requests per hour)
         Returns (is_allowed, remaining_requests)
         """
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             # Get current rate limit data
@@ -105,7 +163,7 @@ class Database:
 
     def get_conversation_history(self, ip_address: str, session_id: str) -> List[Dict[str, str]]:
         """Get conversation history for an IP and session"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             cursor.execute("""
@@ -123,7 +181,7 @@ class Database:
 
     def save_conversation(self, ip_address: str, session_id: str, message: str, response: str):
         """Save a conversation turn and update session history"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             # Save individual chat record
@@ -160,8 +218,8 @@ class Database:
                 })
 
                 # Keep only last 20 messages (10 turns) to prevent database bloat
-                if len(history) > 20:
-                    history = history[-20:]
+                if len(history) > MAX_CONVERSATION_HISTORY:
+                    history = history[-MAX_CONVERSATION_HISTORY:]
 
                 cursor.execute("""
                     UPDATE conversation_sessions
@@ -192,7 +250,7 @@ class Database:
 
     def cleanup_old_sessions(self, days: int = 7):
         """Clean up sessions older than specified days"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
             cutoff_date = datetime.now() - timedelta(days=days)
 
@@ -210,7 +268,7 @@ class Database:
 
     def get_rate_limit_info(self, ip_address: str) -> Dict[str, Any]:
         """Get rate limit information for an IP"""
-        with sqlite3.connect(self.db_path) as conn:
+        with self._connect() as conn:
             cursor = conn.cursor()
 
             cursor.execute("""
@@ -230,4 +288,342 @@ class Database:
                 "requests_made": request_count,
                 "reset_time": next_reset.isoformat(),
                 "time_until_reset": int(time_until_reset)
-            }
\ No newline at end of file
+            }
+
+class MemoryDatabase(StorageBackend):
+    """
+    In-memory storage backend for ephemeral/demo deployments and benchmarks.
+    Memory is bounded: each session keeps a ring buffer of its last messages,
+    expired rate-limit entries are dropped, and the least recently active
+    sessions are evicted once max_sessions is reached. When max_rate_limits
+    entries are tracked, the entry closest to expiring is evicted to make room.
+    """
+
+    def __init__(self, max_sessions: int = 10000, max_rate_limits: int = 100000,
+                 max_history: int = MAX_CONVERSATION_HISTORY, rate_limit_window: timedelta = timedelta(hours=1)):
+        if max_sessions < 1 or max_rate_limits < 1:
+            raise StorageConfigError("Memory backend limits must be at least 1")
+
+        self.max_sessions = max_sessions
+        self.max_rate_limits = max_rate_limits
+        self.max_history = max_history
+        self.rate_limit_window = rate_limit_window
+        self._lock = threading.Lock()
+
+        # ip_address -> [request_count, last_reset], oldest reset first
+        self._rate_limits: "OrderedDict[str, list]" = OrderedDict()
+        # (ip_address, session_id) -> [last_activity, deque of (role, content, timestamp)]
+        self._sessions: "OrderedDict[tuple[str, str], list]" = OrderedDict()
+
+    def _expire_rate_limits(self, current_time: datetime):
+        """Drop rate-limit entries whose window has passed"""
+        while self._rate_limits:
+            ip_address, (_, last_reset) = next(iter(self._rate_limits.items()))
+            if current_time - last_reset < self.rate_limit_window:
+                break
+            del self._rate_limits[ip_address]
+
+    def check_rate_limit(self, ip_address: str, limit: int = 3) -> tuple[bool, int]:
+        """
+        Check if IP has exceeded rate limit (3 requests per hour)
+        Returns (is_allowed, remaining_requests)
+        """
+        with self._lock:
+            current_time = datetime.now()
+            self._expire_rate_limits(current_time)
+
+            entry = self._rate_limits.get(ip_address)
+            if entry is None:
+                # First request from this IP (or previous window expired).
+                # When full, evict the oldest reset, which is closest to expiring
+                if len(self._rate_limits) >= self.max_rate_limits:
+                    self._rate_limits.popitem(last=False)
+                self._rate_limits[ip_address] = [1, current_time]
+                return True, limit - 1
+
+            # Check if limit exceeded
+            if entry[0] >= limit:
+                return False, 0
+
+            entry[0] += 1
+            return True, limit - entry[0]
+
+    def get_rate_limit_info(self, ip_address: str) -> Dict[str, Any]:
+        """Get rate limit information for an IP"""
+        with self._lock:
+            entry = self._rate_limits.get(ip_address)
+            if entry is None or datetime.now() - entry[1] >= self.rate_limit_window:
+                return {"requests_made": 0, "reset_time": None, "time_until_reset": 0}
+
+            request_count, last_reset = entry
+            next_reset = last_reset + self.rate_limit_window
+            time_until_reset = max(0, (next_reset - datetime.now()).total_seconds())
+
+            return {
+                "requests_made": request_count,
+                "reset_time": next_reset.isoformat(),
+                "time_until_reset": int(time_until_reset)
+            }
+
+    def get_conversation_history(self, ip_address: str, session_id: str) -> List[Dict[str, str]]:
+        """Get conversation history for an IP and session"""
+        with self._lock:
+            session = self._sessions.get((ip_address, session_id))
+            if session is None:
+                return []
+            return [
+                {"role": role, "content": content, "timestamp": timestamp}
+                for role, content, timestamp in session[1]
+            ]
+
+    def save_conversation(self, ip_address: str, session_id: str, message: str, response: str):
+        """Save a conversation turn and update session history"""
+        with self._lock:
+            key = (ip_address, session_id)
+            current_time = datetime.now()
+            timestamp = current_time.isoformat()
+
+            session = self._sessions.pop(key, None)
+            if session is None:
+                if len(self._sessions) >= self.max_sessions:
+                    # Evict the least recently active session
+                    self._sessions.popitem(last=False)
+                session = [current_time, deque(maxlen=self.max_history)]
+
+            session[0] = current_time
+            session[1].append(("user", message, timestamp))
+            session[1].append(("assistant", response, timestamp))
+            # Re-insert so sessions stay ordered by last activity
+            self._sessions[key] = session
+
+    def cleanup_old_sessions(self, days: int = 7):
+        """Clean up sessions older than specified days"""
+        with self._lock:
+            current_time = datetime.now()
+            cutoff_date = current_time - timedelta(days=days)
+
+            while self._sessions:
+                key, (last_activity, _) = next(iter(self._sessions.items()))
+                if last_activity >= cutoff_date:
+                    break
+                del self._sessions[key]
+
+            self._expire_rate_limits(current_time)
+
+class _ShardDatabase(Database):
+    """
+    A single shard: writes run on the shard's writer thread through one
+    persistent connection, reads use short-lived connections
+    """
+
+    def __init__(self, db_path: str):
+        self._local = threading.local()
+        super().__init__(db_path)
+
+    def open_writer_connection(self):
+        """Executor initializer: open the writer thread's persistent connection"""
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+
+    def close_writer_connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @contextmanager
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            with super()._connect() as conn:
+                yield conn
+            return
+        with conn:
+            yield conn
+
+class ShardedDatabase(StorageBackend):
+    """
+    SQLite storage split across N database files to avoid a single writer lock.
+    Rate limits are sharded by ip_address and conversations by session_id.
+    Each shard has a single writer thread with its own persistent connection,
+    whose queue serializes that shard's writes; reads go straight to the shard
+    file (WAL mode lets them run alongside writes).
+
+    The shard count is recorded in every shard file and startup is refused if
+    it does not match, since changing it would move keys to different shards.
+    """
+
+    def __init__(self, db_path: str = "anonymous_chat.db", shards: int = 4):
+        if shards < 1:
+            raise StorageConfigError("Number of shards must be at least 1")
+
+        self.shard_paths = self.get_shard_paths(db_path, shards)
+        self.check_layout(db_path, shards)
+
+        self.shards = [_ShardDatabase(path) for path in self.shard_paths]
+        for index, shard in enumerate(self.shards):
+            with shard._connect() as conn:
+                conn.execute("""
+                    CREATE TABLE IF NOT EXISTS shard_meta (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL
+                    )
+                """)
+                conn.executemany("""
+                    INSERT OR IGNORE INTO shard_meta (key, value) VALUES (?, ?)
+                """, [("shard_count", str(shards)), ("shard_index", str(index))])
+
+        self.writers = [
+            ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix=f"db-shard-{i}",
+                initializer=shard.open_writer_connection
+            )
+            for i, shard in enumerate(self.shards)
+        ]
+
+    @staticmethod
+    def get_shard_paths(db_path: str, shards: int) -> List[str]:
+        """Get shard file paths, e.g. anonymous_chat.db -> anonymous_chat.shard0.db"""
+        root, ext = os.path.splitext(db_path)
+        return [f"{root}.shard{i}{ext or '.db'}" for i in range(shards)]
+
+    @classmethod
+    def check_layout(cls, db_path: str, shards: int):
+        """
+        Refuse to start when existing files were written with a different
+        layout: an unsharded database, a different shard count, or extra
+        shard files left over from a larger shard count
+        """
+        if shards > 1 and os.path.exists(db_path):
+            raise StorageConfigError(
+                f"Unsharded database {db_path} exists but SQLITE_SHARDS={shards}. "
+                "Its data would be ignored; move or delete it before enabling sharding."
+            )
+
+        shard_paths = cls.get_shard_paths(db_path, shards + 1)
+        if shards == 1:
+            # Unsharded mode only needs to check that no shard files exist
+            shard_paths = shard_paths[:1]
+            if os.path.exists(shard_paths[0]):
+                raise StorageConfigError(
+                    f"Shard file {shard_paths[0]} exists but SQLITE_SHARDS=1. "
+                    "Set SQLITE_SHARDS to the shard count the data was written with."
+                )
+            return
+
+        if os.path.exists(shard_paths[-1]):
+            raise StorageConfigError(
+                f"Shard file {shard_paths[-1]} exists but SQLITE_SHARDS={shards}. "
+                "Set SQLITE_SHARDS to the shard count the data was written with."
+            )
+
+        for path in shard_paths[:-1]:
+            if not os.path.exists(path):
+                continue
+            with closing(sqlite3.connect(path)) as conn:
+                try:
+                    result = conn.execute(
+                        "SELECT value FROM shard_meta WHERE key = 'shard_count'"
+                    ).fetchone()
+                except sqlite3.OperationalError:
+                    result = None
+            if result and int(result[0]) != shards:
+                raise StorageConfigError(
+                    f"Shard file {path} was written with SQLITE_SHARDS={result[0]} "
+                    f"but SQLITE_SHARDS={shards}. Changing the shard count would "
+                    "move clients to different shards."
+                )
+
+    def _shard_index(self, key: str) -> int:
+        # crc32 is stable across processes, unlike the builtin hash()
+        return zlib.crc32(key.encode("utf-8")) % len(self.shards)
+
+    def _submit(self, key: str, method: str, *args):
+        """Queue a write on the shard owning key and return its future"""
+        index = self._shard_index(key)
+        return self.writers[index].submit(getattr(self.shards[index], method), *args)
+
+    def check_rate_limit(self, ip_address: str, limit: int = 3) -> tuple[bool, int]:
+        """
+        Check if IP has exceeded rate limit (3 requests per hour)
+        Returns (is_allowed, remaining_requests)
+        """
+        return self._submit(ip_address, "check_rate_limit", ip_address, limit).result()
+
+    async def check_rate_limit_async(self, ip_address: str, limit: int = 3) -> tuple[bool, int]:
+        """Awaitable check_rate_limit, so writes to different shards run concurrently"""
+        return await asyncio.wrap_future(
+            self._submit(ip_address, "check_rate_limit", ip_address, limit)
+        )
+
+    def get_rate_limit_info(self, ip_address: str) -> Dict[str, Any]:
+        """Get rate limit information for an IP"""
+        return self.shards[self._shard_index(ip_address)].get_rate_limit_info(ip_address)
+
+    def get_conversation_history(self, ip_address: str, session_id: str) -> List[Dict[str, str]]:
+        """Get conversation history for an IP and session"""
+        return self.shards[self._shard_index(session_id)].get_conversation_history(ip_address, session_id)
+
+    def save_conversation(self, ip_address: str, session_id: str, message: str, response: str):
+        """Save a conversation turn and update session history"""
+        self._submit(session_id, "save_conversation", ip_address, session_id, message, response).result()
+
+    async def save_conversation_async(self, ip_address: str, session_id: str, message: str, response: str):
+        """Awaitable save_conversation, so writes to different shards run concurrently"""
+        await asyncio.wrap_future(
+            self._submit(session_id, "save_conversation", ip_address, session_id, message, response)
+        )
+
+    def cleanup_old_sessions(self, days: int = 7):
+        """Clean up sessions older than specified days on every shard"""
+        futures = [
+            writer.submit(shard.cleanup_old_sessions, days)
+            for shard, writer in zip(self.shards, self.writers)
+        ]
+        for future in futures:
+            future.result()
+
+    def close(self):
+        """Drain pending writes, close writer connections and stop the writer threads"""
+        for shard, writer in zip(self.shards, self.writers):
+            writer.submit(shard.close_writer_connection)
+            writer.shutdown(wait=True)
+
+def _int_setting(name: str, default: int) -> int:
+    """Read an integer setting from the environment, rejecting non-integer values"""
+    value = os.getenv(name, str(default))
+    try:
+        return int(value)
+    except ValueError:
+        raise StorageConfigError(f"{name} must be an integer, got {value!r}") from None
+
+def create_database(backend: Optional[str] = None) -> StorageBackend:
+    """
+    Create the storage backend selected by STORAGE_BACKEND ("sqlite" or "memory").
+    SQLite uses DATABASE_PATH, split across SQLITE_SHARDS files when greater than 1;
+    the memory engine is bounded by MEMORY_MAX_SESSIONS and MEMORY_MAX_RATE_LIMITS.
+    """
+    backend = (backend or os.getenv("STORAGE_BACKEND", "sqlite")).lower()
+
+    if backend == "sqlite":
+        db_path = os.getenv("DATABASE_PATH", "anonymous_chat.db")
+        shards = _int_setting("SQLITE_SHARDS", 1)
+        if shards < 1:
+            raise StorageConfigError(f"SQLITE_SHARDS must be at least 1, got {shards}")
+        if shards > 1:
+            return ShardedDatabase(db_path, shards)
+        ShardedDatabase.check_layout(db_path, 1)
+        return Database(db_path)
+    if backend == "memory":
+        max_sessions = _int_setting("MEMORY_MAX_SESSIONS", 10000)
+        max_rate_limits = _int_setting("MEMORY_MAX_RATE_LIMITS", 100000)
+        if max_sessions < 1:
+            raise StorageConfigError(f"MEMORY_MAX_SESSIONS must be at least 1, got {max_sessions}")
+        if max_rate_limits < 1:
+            raise StorageConfigError(f"MEMORY_MAX_RATE_LIMITS must be at least 1, got {max_rate_limits}")
+        return MemoryDatabase(max_sessions=max_sessions, max_rate_limits=max_rate_limits)
+
+    raise StorageConfigError(f"Unknown storage backend: {backend}. Use 'sqlite' or 'memory'.")
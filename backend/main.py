@@ -8,7 +8,7 @@ import asyncio
 from contextlib import asynccontextmanager
 import os
 
-from database import Database
+from database import create_database, StorageConfigError
 from gemini_ai import GeminiAI
 
 # Pydantic models
@@ -44,8 +44,8 @@ async def lifespan(app: FastAPI):
 
     try:
         # Initialize database
-        db = Database()
-        print("✅ Database initialized successfully")
+        db = create_database()
+        print(f"✅ Database initialized successfully ({type(db).__name__})")
 
         # Initialize Gemini AI
         api_key = os.getenv("GOOGLE_API_KEY")
@@ -63,11 +63,17 @@ async def lifespan(app: FastAPI):
 
         yield
 
+    except StorageConfigError as e:
+        # Refuse to start rather than serve from a mismatched storage layout
+        print(f"❌ Storage configuration error: {e}")
+        raise
     except Exception as e:
         print(f"❌ Startup error: {e}")
         yield
     finally:
         print("🔄 Shutting down services...")
+        if db:
+            db.close()
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -116,7 +122,7 @@ async def rate_limit_middleware(request: Request, call_next):
     # Apply rate limiting only to chat endpoint
     if request.url.path == "/chat" and request.method == "POST":
         ip_address = get_client_ip(request)
-        is_allowed, remaining = db.check_rate_limit(ip_address, limit=3)
+        is_allowed, remaining = await db.check_rate_limit_async(ip_address, limit=3)
 
         if not is_allowed:
             rate_info = db.get_rate_limit_info(ip_address)
@@ -208,7 +214,7 @@ async def chat(message_data: ChatMessage, request: Request):
         )
 
         # Save conversation to database
-        db.save_conversation(
+        await db.save_conversation_async(
             ip_address=ip_address,
             session_id=session_id,
             message=message_data.message,